@@ -1,13 +1,15 @@
 import hashlib
-from domain.transaction import Transaction
+from domain.transaction import TransactionBatch
 
 class Block:
-    def __init__(self, previous_hash: bytes, epoch: int, length: int, transactions: list[Transaction]):
+    __slots__ = ('previous_hash', 'epoch', 'length', 'transactions', 'is_finalized', 'children', '_hash')
+
+    def __init__(self, previous_hash: bytes, epoch: int, length: int, transactions: TransactionBatch):
         """
         @param previous_hash: SHA1 hash of the previous block
         @param epoch: the epoch number the block was generated
         @param length: the number of the block in the proposer blockchain
-        @param transactions: list of transactions on the block
+        @param transactions: batch of transactions on the block
         """
         self.previous_hash = previous_hash
         self.epoch = epoch
@@ -15,14 +17,32 @@ class Block:
         self.transactions = transactions
         self.is_finalized = False
         self.children = []
+        self._hash = None
 
     def hash(self) -> bytes:
         """
-        Generates the hash of the block
+        Generates the hash of the block, computed once since its content never changes
         :return: the hash of the block
         """
-        block_str = f"{self.previous_hash}{self.epoch}{self.length}{[str(t) for t in self.transactions]}"
-        return hashlib.sha1(block_str.encode()).digest()
+        if self._hash is None:
+            hasher = hashlib.sha1()
+            hasher.update(self.previous_hash)
+            hasher.update(f"{self.epoch}:{self.length}".encode())
+            hasher.update(self.transactions.digest())
+            self._hash = hasher.digest()
+        return self._hash
+
+    def __getstate__(self):
+        """
+        Only the content of the block is serialized, local chain state is rebuilt by the receiver
+        """
+        return self.previous_hash, self.epoch, self.length, self.transactions
+
+    def __setstate__(self, state):
+        self.previous_hash, self.epoch, self.length, self.transactions = state
+        self.is_finalized = False
+        self.children = []
+        self._hash = None
     
 
     def __hash__(self) -> int:
@@ -1,18 +1,44 @@
 from domain.block import Block
+from domain.transaction import TransactionBatch
+from domain.committee import Committee
+from domain.snapshot import ChainSnapshot
 from utils.utils import parse_chain
 from threading import RLock
 
 class BlockChain:
-    def __init__(self, node_id: int, num_nodes: int):
+    def __init__(self, node_id: int, committee: Committee, lock=None):
         self.node_id = node_id
-        self.num_nodes = num_nodes
+        self.committee = committee
         self.votes = {}  # tracks votes for each block by hash
-        self.genesis = Block(previous_hash=b'0', epoch=0, length=0, transactions=[])
+        self.vote_weights = {} # running sum of the voters stake for each block by hash
+        self.vote_epochs = {} # epoch of each voted block by hash, used to prune old votes
+        self.genesis = Block(previous_hash=b'0', epoch=0, length=0, transactions=TransactionBatch())
         self.genesis.is_finalized = True
         self.finalized_chain = [self.genesis] # contains only finalized blocks
         self.non_finalized_blocks = {self.genesis.hash(): self.genesis} # tree-like structure to manage forks
-        self.lock = RLock() # reentrant lock for thread safety
+        self.notarized = {} # epochs of the blocks with a quorum of votes by hash
+        self.lock = lock if lock is not None else RLock() # reentrant lock for thread safety, only taken by writers
         self.last_block = self.genesis
+        self.version = 0
+        self._snapshot = None
+        self.publish()
+
+    def publish(self):
+        """
+        Publishes an immutable snapshot of the current state
+        Must be called by writers while holding the lock, after each mutation
+        """
+        self._snapshot = ChainSnapshot(
+            self.version, self.finalized_chain, self.non_finalized_blocks, self.notarized, self.last_block
+        )
+        self.version += 1
+
+    def snapshot(self) -> ChainSnapshot:
+        """
+        Returns the last published snapshot of the blockchain without locking
+        :return: The current snapshot
+        """
+        return self._snapshot
 
     def add_block(self, block: Block):
         """
@@ -25,6 +51,7 @@ class BlockChain:
             parent_block.children.append(block) # child parent relationship
             self.non_finalized_blocks[block.hash()] = block
             self.last_block = block
+            self.publish()
 
     def add_vote(self, block: Block, node_id: int):
         """
@@ -33,31 +60,41 @@ class BlockChain:
         :param node_id: The ID of the node casting the vote
         """
         with self.lock:
-            if block.hash() not in self.votes:
-                self.votes[block.hash()] = set()
-            self.votes[block.hash()].add(node_id)
+            block_hash = block.hash()
+            if block_hash not in self.votes:
+                self.votes[block_hash] = set()
+                self.vote_weights[block_hash] = 0
+                self.vote_epochs[block_hash] = block.epoch
+            if node_id in self.votes[block_hash]:
+                return
+            self.votes[block_hash].add(node_id)
+            self.vote_weights[block_hash] += self.committee.stake(node_id)
             # print(f"Vote added for block {block} by node {node_id}")
+            if block_hash not in self.notarized and self.committee.has_quorum(self.vote_weights[block_hash]):
+                self.notarized[block_hash] = block.epoch # quorum required for notarization
+                self.publish()
 
     def update_finalization(self):
         """
         Stabilizes on the longest fork with at least three consecutive notarized blocks
         Finalizes the fork and discards other blocks
-        """
-        with self.lock:
-            longest_fork = []
-            forks = self.get_forks()
-            for fork in forks:
-                # check for three consecutive notarized blocks
-                for i in range(len(fork) - 2):
-                    triplet = fork[i:i+3]
-                    all_notarized = all(self.check_notarization(b) for b in triplet)
-                    all_consecutive = all(triplet[j].epoch + 1 == triplet[j+1].epoch for j in range(2))
-                    if all_notarized and all_consecutive:
-                        if len(fork) > len(longest_fork):
-                            longest_fork = fork
-                
-            if longest_fork: # finalize the longest notarized fork
-                self.stabilize_fork(longest_fork)
+        The search runs on a snapshot, the lock is only taken to finalize
+        """
+        snapshot = self.snapshot()
+        longest_fork = []
+        forks = snapshot.get_forks()
+        for fork in forks:
+            # check for three consecutive notarized blocks
+            for i in range(len(fork) - 2):
+                triplet = fork[i:i+3]
+                all_notarized = all(snapshot.check_notarization(b) for b in triplet)
+                all_consecutive = all(triplet[j].epoch + 1 == triplet[j+1].epoch for j in range(2))
+                if all_notarized and all_consecutive:
+                    if len(fork) > len(longest_fork):
+                        longest_fork = fork
+
+        if longest_fork: # finalize the longest notarized fork
+            self.stabilize_fork(longest_fork)
 
     def check_notarization(self, block: Block) -> bool:
         """
@@ -65,10 +102,7 @@ class BlockChain:
         :param block: The block to be checked
         :return: True if the block is notarized, False otherwise
         """
-        if block.genesis: # genesis block is always notarized
-            return True
-        votes = self.votes.get(block.hash(), set())
-        return len(votes) > self.num_nodes / 2 # majority required for notarization
+        return self.snapshot().check_notarization(block)
 
     def get_fork_from_block(self, block: Block):
         """
@@ -77,12 +111,12 @@ class BlockChain:
         :param block: The block to trace back from
         :return: The fork (list of blocks) in chronological order
         """
-        with self.lock:
-            fork = []
-            while block:
-                fork.append(block)
-                block = next((b for b in self.non_finalized_blocks.values() if b.hash() == block.previous_hash), None)
-            return fork[::-1] # return the fork in chronological order
+        blocks = self.snapshot().non_finalized_blocks
+        fork = []
+        while block:
+            fork.append(block)
+            block = blocks.get(block.previous_hash, None)
+        return fork[::-1] # return the fork in chronological order
 
 
     def stabilize_fork(self, fork: list[Block]):
@@ -109,6 +143,17 @@ class BlockChain:
             reachable_blocks = self.get_descendants(last_finalized_hash)
             self.non_finalized_blocks = {b.hash(): b for b in reachable_blocks}
 
+            # keep the votes and notarizations of the fork tree and of newer blocks that were not received yet,
+            # dropping those of finalized and discarded blocks
+            def is_live(h: bytes, epoch: int) -> bool:
+                return h in self.non_finalized_blocks or epoch > last_finalized.epoch
+
+            self.votes = {h: v for h, v in self.votes.items() if is_live(h, self.vote_epochs[h])}
+            self.vote_weights = {h: w for h, w in self.vote_weights.items() if h in self.votes}
+            self.vote_epochs = {h: e for h, e in self.vote_epochs.items() if h in self.votes}
+            self.notarized = {h: epoch for h, epoch in self.notarized.items() if is_live(h, epoch)}
+            self.publish()
+
     def get_descendants(self, start_hash):
         """
         Retrieves all descendants of a block in the blockchain
@@ -127,34 +172,20 @@ class BlockChain:
         Each fork is a path from a leaf block back to the genesis block
         :return: A list of forks, where each fork is a list of blocks in order
         """
-        with self.lock:
-            forks = []
-            leaf_blocks = [block for block in self.non_finalized_blocks.values() if not block.children] 
-            for leaf in leaf_blocks:
-                fork = []
-                current = leaf
-                while current:
-                    fork.append(current)
-                    if current.genesis:
-                        break  # stop at the genesis block
-                    current = self.non_finalized_blocks.get(current.previous_hash, None)
-                forks.append(fork[::-1]) # reverse to chronological order
-            return forks
+        return self.snapshot().get_forks()
     
     def get_notarized_blocks(self):
-        with self.lock:
-            return [block for block in self.non_finalized_blocks.values() if self.check_notarization(block)]
+        return self.snapshot().get_notarized_blocks()
     
     def get_non_notarized_blocks(self):
-        with self.lock:
-            return list(set(self.non_finalized_blocks.values()) - set(self.get_notarized_blocks()))
+        return self.snapshot().get_non_notarized_blocks()
 
     def length(self):
         """
         Returns the length of the blockchain
         :return: The length of the blockchain
         """
-        return self.last_block.length - 1
+        return self.snapshot().last_block.length - 1
 
     def __getitem__(self, item):
         """
@@ -162,16 +193,17 @@ class BlockChain:
         :param item: The index of the block
         :return: The block at the given index
         """
-        return self.finalized_chain[item]
+        return self.snapshot().finalized_chain[item]
 
     def __str__(self):
         """
         String representation of both the blockchain and the finalized chain
         :return: The string representation of the blockchain and the finalized chain
         """
-        blocks_repr = sorted([b.epoch for b in self.non_finalized_blocks.values()])[1:]
-        chain_repr = parse_chain([str(b) for b in self.finalized_chain], "Finalized Blockchain")
-        forks = self.get_forks()
+        snapshot = self.snapshot()
+        blocks_repr = sorted([b.epoch for b in snapshot.non_finalized_blocks.values()])[1:]
+        chain_repr = parse_chain([str(b) for b in snapshot.finalized_chain], "Finalized Blockchain")
+        forks = snapshot.get_forks()
         forks_repr = "\n\t".join(parse_chain([str(b) for b in fork], "Fork") for fork in forks) if len(forks) > 1 else "No forks"
-        non_notarized = [b.epoch for b in self.get_non_notarized_blocks()]
+        non_notarized = [b.epoch for b in snapshot.get_non_notarized_blocks()]
         return f"\nNon-Finalized Blocks:{blocks_repr}\nNon-Notarized blocks:{non_notarized}\n{chain_repr}: \n\t{forks_repr}\n"
\ No newline at end of file
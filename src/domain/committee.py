@@ -0,0 +1,74 @@
+import hashlib
+from bisect import bisect_right
+from itertools import accumulate
+
+class Committee:
+    def __init__(self, stakes: dict[int, int], seed: int, quorum: float = 0.5, schedule_size: int = 64):
+        """
+        Weighted committee of nodes used for leader election and vote tallying
+        @param stakes: the stake of each node by id
+        @param seed: the seed for the leader election
+        @param quorum: fraction of the total stake that must be exceeded for a quorum
+        @param schedule_size: number of upcoming epochs to precompute the leader for
+        """
+        if not stakes or any(stake <= 0 for stake in stakes.values()):
+            raise ValueError("Committee stakes must be positive")
+        if not 0 < quorum < 1:
+            raise ValueError("Quorum must be between 0 and 1")
+        self.stakes = dict(stakes)
+        self.seed = seed
+        self.quorum = quorum
+        self.schedule_size = schedule_size
+        self.members = sorted(self.stakes)
+        self.cumulative = list(accumulate(self.stakes[m] for m in self.members))
+        self.total_stake = self.cumulative[-1]
+        self.quorum_stake = self.total_stake * quorum
+        self.schedule = {} # precomputed leaders by epoch
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def stake(self, node_id: int) -> int:
+        """
+        Returns the stake of a node, nodes outside the committee have no stake
+        :param node_id: The ID of the node
+        :return: The stake of the node
+        """
+        return self.stakes.get(node_id, 0)
+
+    def has_quorum(self, weight: int) -> bool:
+        """
+        Checks if the given voting weight exceeds the quorum threshold
+        :param weight: The sum of the stakes of the voters
+        :return: True if the weight is a quorum, False otherwise
+        """
+        return weight > self.quorum_stake
+
+    def compute_leader(self, epoch: int) -> int:
+        """
+        Computes the leader of an epoch as a hash of the seed and the epoch
+        Each node is elected with probability proportional to its stake
+        :param epoch: The epoch number
+        :return: The ID of the leader
+        """
+        digest = hashlib.sha256(f"{self.seed}:{epoch}".encode()).digest()
+        point = int.from_bytes(digest[:8], byteorder='big') % self.total_stake
+        return self.members[bisect_right(self.cumulative, point)]
+
+    def leader(self, epoch: int) -> int:
+        """
+        Returns the leader of an epoch, precomputing the schedule for the upcoming epochs
+        :param epoch: The epoch number
+        :return: The ID of the leader
+        """
+        if epoch not in self.schedule:
+            self.schedule = {e: self.compute_leader(e) for e in range(epoch, epoch + self.schedule_size)}
+        return self.schedule[epoch]
+
+    def rotating_leader(self, epoch: int) -> int:
+        """
+        Returns the leader of an epoch in a round-robin fashion
+        :param epoch: The epoch number
+        :return: The ID of the leader
+        """
+        return self.members[epoch % len(self.members)]
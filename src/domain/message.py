@@ -11,16 +11,20 @@ class MessageType(Enum):
     @param PROPOSE: to be used for proposing blocks - the content is a Block
     @param VOTE: to be used for voting on blocks - the content is a Block, with the Transactions field empty
     @param ECHO: to be used when echoing a message - the content is a Message
+    @param DIGEST: to be used in gossip mode to advertise recent messages - the content maps epochs to message hashes
+    @param REQUEST: to be used in gossip mode to pull missing messages - the content maps epochs to message hashes
     """
     PROPOSE = 1
     VOTE = 2
     ECHO = 3
+    DIGEST = 4
+    REQUEST = 5
 
     def __str__(self) -> str:
         return self.name
 
 class Message:
-    def __init__(self, type: MessageType, content: 'Message' | Block, sender: int, epoch: int):
+    def __init__(self, type: MessageType, content: 'Message' | Block | dict[int, list[str]], sender: int, epoch: int):
         """
         @param type: type of the message
         @param content: content of the message
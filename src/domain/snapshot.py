@@ -0,0 +1,75 @@
+from types import MappingProxyType
+from domain.block import Block
+
+class ChainSnapshot:
+    def __init__(
+        self,
+        version: int,
+        finalized_chain: list[Block],
+        non_finalized_blocks: dict[bytes, Block],
+        notarized: dict[bytes, int],
+        last_block: Block
+    ):
+        """
+        Immutable view of the blockchain published after each mutation
+        Readers take a reference to the current snapshot without locking
+        @param version: the number of mutations published before this snapshot
+        @param finalized_chain: the finalized blocks in chronological order
+        @param non_finalized_blocks: the not finalized blocks by hash
+        @param notarized: the hashes of the notarized blocks
+        @param last_block: the last block added to the blockchain
+        """
+        self.version = version
+        self.finalized_chain = tuple(finalized_chain)
+        self.non_finalized_blocks = MappingProxyType(dict(non_finalized_blocks))
+        self.notarized = frozenset(notarized)
+        self.last_block = last_block
+        # parent -> children links as seen at publication time, since Block.children keeps changing
+        children = {h: [] for h in self.non_finalized_blocks}
+        for h, block in self.non_finalized_blocks.items():
+            if not block.genesis and block.previous_hash in children:
+                children[block.previous_hash].append(h)
+        self.children = MappingProxyType({h: tuple(c) for h, c in children.items()})
+
+    def check_notarization(self, block: Block) -> bool:
+        """
+        Checks if a block was notarized when the snapshot was published
+        :param block: The block to be checked
+        :return: True if the block is notarized, False otherwise
+        """
+        return block.genesis or block.hash() in self.notarized
+
+    def get_forks(self) -> list[list[Block]]:
+        """
+        Retrieves all forks of the snapshot as a list of lists
+        :return: A list of forks, where each fork is a list of blocks in order
+        """
+        forks = []
+        leaf_hashes = [h for h, c in self.children.items() if not c]
+        for leaf_hash in leaf_hashes:
+            fork = []
+            current = self.non_finalized_blocks[leaf_hash]
+            while current:
+                fork.append(current)
+                if current.genesis:
+                    break  # stop at the genesis block
+                current = self.non_finalized_blocks.get(current.previous_hash, None)
+            forks.append(fork[::-1]) # reverse to chronological order
+        return forks
+
+    def get_notarized_blocks(self) -> list[Block]:
+        return [block for block in self.non_finalized_blocks.values() if self.check_notarization(block)]
+
+    def get_non_notarized_blocks(self) -> list[Block]:
+        return [block for block in self.non_finalized_blocks.values() if not self.check_notarization(block)]
+
+    def longest_notarized_block(self) -> Block | None:
+        """
+        Finds the head of the longest notarized chain
+        :return: The notarized block with the greatest length
+        """
+        return max(
+            self.non_finalized_blocks.values(),
+            key=lambda block: block.length if self.check_notarization(block) else 0,
+            default=None
+        )
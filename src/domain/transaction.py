@@ -1,11 +1,20 @@
+import hashlib
 import pickle
+import struct
+import sys
+from array import array
+
+TX_ID_SIZE = 20 # bytes of a SHA1 digest
+TX_SIZE = 4 + 4 + 8 + TX_ID_SIZE # serialized bytes per transaction: sender, receiver, amount and id
 
 class Transaction:
-    def __init__(self, sender: int, receiver: int, tx_id: int, amount: float):
+    __slots__ = ('sender', 'receiver', 'tx_id', 'amount')
+
+    def __init__(self, sender: int, receiver: int, tx_id: bytes, amount: float):
         """
         @param sender: sender id
         @param receiver: receiver id
-        @param tx_id: transaction id, unique with sender
+        @param tx_id: transaction id, 20 bytes unique with sender
         @param amount: amount to be transferred
         """
         self.sender = sender
@@ -35,4 +44,119 @@ class Transaction:
         :return: string representation of the transaction
         """
         return (f"Transaction(sender={self.sender}, receiver={self.receiver},"
-                f" tx_id={self.tx_id}, amount={self.amount})")
\ No newline at end of file
+                f" tx_id={self.tx_id.hex()}, amount={self.amount})")
+
+
+class TransactionBatch:
+    """
+    Columnar list of transactions, each field is kept in its own contiguous buffer
+    """
+    __slots__ = ('senders', 'receivers', 'amounts', 'ids')
+
+    def __init__(self):
+        self.senders = array('I')
+        self.receivers = array('I')
+        self.amounts = array('d')
+        self.ids = bytearray() # TX_ID_SIZE bytes per transaction
+
+    def append(self, sender: int, receiver: int, tx_id: bytes, amount: float):
+        """
+        Appends a transaction to the batch
+        :param sender: sender id
+        :param receiver: receiver id
+        :param tx_id: transaction id, 20 bytes unique with sender
+        :param amount: amount to be transferred
+        """
+        if len(tx_id) != TX_ID_SIZE:
+            raise ValueError(f"Transaction id must have {TX_ID_SIZE} bytes")
+        self.senders.append(sender)
+        self.receivers.append(receiver)
+        self.amounts.append(amount)
+        self.ids += tx_id
+
+    def serialize(self) -> bytes:
+        """
+        Serialize the batch as a count followed by the little-endian buffers
+        :return: the serialized batch
+        """
+        columns = [self.senders, self.receivers, self.amounts]
+        if sys.byteorder == 'big':
+            columns = [array(c.typecode, c) for c in columns]
+            for c in columns:
+                c.byteswap()
+        return struct.pack('<I', len(self)) + b''.join(c.tobytes() for c in columns) + bytes(self.ids)
+
+    @staticmethod
+    def deserialize(data: bytes) -> 'TransactionBatch':
+        """
+        Deserialize the batch (convert from bytes to object)
+        :param data: the serialized batch
+        :return: the deserialized batch
+        :raises ValueError: if the data does not hold exactly the announced number of transactions
+        """
+        if len(data) < 4:
+            raise ValueError("Malformed transaction batch: missing header")
+        (count,) = struct.unpack_from('<I', data)
+        if len(data) != 4 + count * TX_SIZE:
+            raise ValueError(f"Malformed transaction batch: {len(data)} bytes for {count} transactions")
+        batch = TransactionBatch()
+        offset = 4
+        for column in (batch.senders, batch.receivers, batch.amounts):
+            size = count * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            offset += size
+        batch.ids = bytearray(data[offset:offset + count * TX_ID_SIZE])
+        return batch
+
+    def __reduce__(self):
+        return TransactionBatch.deserialize, (self.serialize(),)
+
+    def digest(self) -> bytes:
+        """
+        Generates the SHA1 hash of the batch directly from its buffers
+        :return: the hash of the batch
+        """
+        return hashlib.sha1(self.serialize()).digest()
+
+    def is_valid(self) -> bool:
+        """
+        Checks that the columns are consistent and every transaction is well formed
+        :return: True if the batch is valid, False otherwise
+        """
+        count = len(self.senders)
+        if not (len(self.receivers) == len(self.amounts) == count and len(self.ids) == count * TX_ID_SIZE):
+            return False
+        if any(s == r for s, r in zip(self.senders, self.receivers)):
+            return False
+        return all(amount > 0 for amount in self.amounts)
+
+    def copy(self) -> 'TransactionBatch':
+        batch = TransactionBatch()
+        batch.senders = array('I', self.senders)
+        batch.receivers = array('I', self.receivers)
+        batch.amounts = array('d', self.amounts)
+        batch.ids = bytearray(self.ids)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.senders)
+
+    def __getitem__(self, index: int) -> Transaction:
+        """
+        Returns a view of the transaction at the given index
+        :param index: The index of the transaction
+        :return: The transaction at the given index
+        """
+        if not isinstance(index, int):
+            raise TypeError(f"TransactionBatch indices must be integers, not {type(index).__name__}")
+        index = range(len(self))[index]
+        tx_id = bytes(self.ids[index * TX_ID_SIZE:(index + 1) * TX_ID_SIZE])
+        return Transaction(self.senders[index], self.receivers[index], tx_id, self.amounts[index])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"TransactionBatch({len(self)} transactions)"
@@ -1,26 +1,39 @@
-import subprocess
+import os
 import sys
-from utils.utils import *
+from datetime import datetime
+from utils.config import Config, load
+from utils.utils import get_time_plus, parse_program_args
 
-if __name__ == "__main__":
-    config = load_config("../config.yaml")
-    print("Configuration file loaded")
+def launch_nodes(config: Config, config_path: str, ids: list[int] | None):
+    """
+    Launches the nodes each in a separate terminal window
+    A new start time is only set when launching the whole cluster, so nodes launched
+    by id while the others are running recover and join the current epoch
+    :param config: the validated configuration
+    :param config_path: path to the configuration file, passed on to the nodes
+    :param ids: the ids of the nodes to launch, all nodes if None
+    """
+    import subprocess # only needed to launch nodes
+
+    nodes = [config.node(id) for id in ids] if ids else config.nodes
 
-    wait_for = config['wait_for']
-    wait_for_time = get_time_plus(datetime.now(), wait_for)
-    with open('../start_time.txt', 'w') as f:
-        f.write(wait_for_time.strftime('%H:%M:%S'))
+    if ids is None or not os.path.exists('../start_time.txt'):
+        wait_for_time = get_time_plus(datetime.now(), config.wait_for)
+        with open('../start_time.txt', 'w') as f:
+            f.write(wait_for_time.strftime('%H:%M:%S'))
 
-    print("Start time set to", wait_for_time)
+        print("Start time set to", wait_for_time)
+    else:
+        print("Keeping the start time of the running cluster")
 
-    nodes = config['nodes']
     for node in nodes:
         command = [
             sys.executable,
-            "node.py",
-            "--id", str(node['id']),
+            "main.py",
+            "--id", str(node.id),
+            "--config", config_path,
         ]
-        node_title = f"Node {node['id']}"
+        node_title = f"Node {node.id}"
         if sys.platform == "win32":
             subprocess.Popen(["start", "cmd", "/K", f"title {node_title} &&"] + command, shell=True)
         elif sys.platform == "darwin":
@@ -29,4 +42,20 @@ if __name__ == "__main__":
         else:
             subprocess.Popen(["gnome-terminal", "--title", node_title, "--"] + command)
 
-        print(f"Node {node['id']} started on terminal {node['ip']}:{node['port']}")
\ No newline at end of file
+        print(f"Node {node.id} started on terminal {node.ip}:{node.port}")
+
+if __name__ == "__main__":
+    args = parse_program_args()
+    try:
+        config = load(args.config)
+        for id in [args.id] if args.id is not None else args.ids or []:
+            config.node(id) # fail before starting anything if an id is unknown
+    except ValueError as e:
+        sys.exit(str(e))
+
+    if args.id is not None:
+        from node import run_node # only needed to run a node in this process
+        run_node(config, args.id)
+    else:
+        print("Configuration file loaded")
+        launch_nodes(config, args.config, args.ids)
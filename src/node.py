@@ -3,14 +3,18 @@ import socket
 import threading
 import time
 import hashlib
+import signal
 
 from collections import deque
 from domain.blockchain import BlockChain
-from domain.transaction import Transaction
+from domain.committee import Committee
+from domain.transaction import TransactionBatch
 from domain.block import Block
 from domain.message import Message, MessageType
 from domain.state import State
+from utils.config import Config
 from utils.utils import *
+from utils.profiler import EpochProfiler, TimedLock
 
 class Node:
     def __init__(
@@ -18,36 +22,52 @@ class Node:
         id: int,
         host: str,
         port: int,
-        peers: list[tuple[str, int]],
+        peers: dict[int, tuple[str, int]],
         epoch_duration: int,
-        seed: int,
+        committee: Committee,
         start_time: str,
         confusion_start: int,
-        confusion_duration: int
+        confusion_duration: int,
+        dissemination: str,
+        gossip_fanout: int,
+        profiler: EpochProfiler
     ):
         """
         Initializes a new node
         @param id: the id of the node
         @param host: the host of the node
         @param port: the port of the node
-        @param peers: the list of neighboring nodes
+        @param peers: the addresses of the neighboring nodes by id
         @param epoch_duration: the duration of an epoch in seconds
-        @param seed: the seed for the leader election
+        @param committee: the committee used for leader election and notarization
+        @param dissemination: how messages are spread, "urb" (full mesh echo) or "gossip"
+        @param gossip_fanout: number of random peers a message is forwarded to in gossip mode
+        @param profiler: the profiler of selected epochs, disabled unless configured or signaled
         """
         self.id = id
         self.host = host
         self.port = port
         self.peers = peers
         self.epoch_duration = epoch_duration
-        self.seed = seed
+        self.committee = committee
         self.start_time = start_time
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.peer_sockets = {}
-        self.pending_tx = []
+        self.send_locks = {peer: threading.Lock() for peer in self.peers.values()} # keep frames from interleaving
+        self.pending_tx = TransactionBatch()
+        self.tx_lock = threading.Lock() # guards appends to pending_tx and its hand-off to a block
         self.current_leader = 0
         self.current_epoch = 1
-        self.blockchain = BlockChain(self.id, len(self.peers) + 1) # initialize the blockchain
-        self.received_messages = deque(maxlen=200) # avoid processing the same message multiple times
+        self.profiler = profiler
+        # initialize the blockchain, its lock measures contention while profiling
+        self.blockchain = BlockChain(self.id, self.committee, TimedLock(self.profiler))
+        self.retained_epochs = 5 # epochs of messages remembered, older messages are ignored
+        self.received_messages = {} # hashes of the delivered messages by epoch, to process each message once
+        self.message_store = {} # recent messages by epoch and hash, served to peers pulling them in gossip mode
+        self.store_lock = threading.Lock() # guards message_store, read by the anti-entropy thread
+        self.dissemination = dissemination
+        self.gossip_fanout = gossip_fanout
+        self.rng = random.Random() # separate stream for peer sampling
         self.state = State.WAITING
         self.confusion_start = confusion_start
         self.confusion_duration = confusion_duration
@@ -60,7 +80,7 @@ class Node:
         self.wait_start_time()
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(len(self.peers))
-        for peer in self.peers:
+        for peer in self.peers.values():
             self.connect_to_peer(peer)
         print(f"Node {self.id} started on {self.host}:{self.port}")
         threading.Thread(target=self.start_server, daemon=True).start()
@@ -82,6 +102,8 @@ class Node:
         threading.Thread(target=self.run_protocol).start()
         threading.Thread(target=self.process_messages).start()
         threading.Thread(target=self.reconnect_peers).start()
+        if self.dissemination == "gossip":
+            threading.Thread(target=self.anti_entropy).start()
         while True:
             try:
                 client_socket, address = self.server_socket.accept()
@@ -105,7 +127,8 @@ class Node:
                     while self.queue:
                         msg = self.queue.popleft()
                         if self.current_epoch >= msg.epoch:
-                            self.handle_message(msg)
+                            with self.profiler.profile_thread(self.current_epoch, "messages"):
+                                self.handle_message(msg)
                         else:
                             # ignore messages from future epochs to ensure synchronization
                             self.queue.appendleft(msg) 
@@ -129,7 +152,7 @@ class Node:
         Tries to reconnect to all peers
         """
         while True:
-            for peer in self.peers:
+            for peer in self.peers.values():
                 if self.peer_sockets[peer] is None:
                     self.connect_to_peer(peer)
                     if self.peer_sockets[peer] is not None:
@@ -150,9 +173,10 @@ class Node:
 
             # generate a unique tx id
             nonce = random.randint(0, 1000000)
-            id = hashlib.sha1(f"{sender}{nonce}".encode()).hexdigest()
+            id = hashlib.sha1(f"{sender}{nonce}".encode()).digest()
 
-            self.pending_tx.append(Transaction(sender, receiver, int(id, 16), amount))
+            with self.tx_lock:
+                self.pending_tx.append(sender, receiver, id, amount)
             time.sleep(self.epoch_duration / 2)
 
     def handle_connection(self, client_socket: socket.socket):
@@ -166,7 +190,12 @@ class Node:
                 length = int.from_bytes(bytes, byteorder='big')
         
                 data = client_socket.recv(length)
-                if message := Message.deserialize(data):
+                try:
+                    message = Message.deserialize(data)
+                except ValueError as e:
+                    print(f"Dropping malformed message: {e}")
+                    continue
+                if message:
                     self.queue.append(message)
         except EOFError:
             pass
@@ -182,15 +211,130 @@ class Node:
         if self.state != State.RUNNING:
             return
 
-        for peer, peer_socket in self.peer_sockets.items():
+        for peer in list(self.peer_sockets):
+            self.send(peer, message)
+
+    def send(self, peer: tuple[str, int], message: Message):
+        """
+        Sends a message to a single peer
+        """
+        peer_socket = self.peer_sockets.get(peer)
+        if peer_socket is None:
+            return
+        serialized = message.serialize()
+        length = len(serialized).to_bytes(4, byteorder='big')
+        with self.send_locks[peer]: # several threads send on the same socket
             try:
-                if peer_socket is not None:
-                    serialized = message.serialize()
-                    length = len(serialized).to_bytes(4, byteorder='big')
-                    peer_socket.sendall(length + serialized)
+                peer_socket.sendall(length + serialized)
             except socket.error:
                 self.peer_sockets[peer] = None
 
+    def broadcast(self, message: Message):
+        """
+        Broadcasts a message created by this node using the configured dissemination mode
+        In gossip mode the message is delivered locally first, which forwards it to random peers
+        """
+        if self.dissemination == "gossip":
+            if self.state == State.RUNNING:
+                self.queue.append(message)
+        else:
+            self.urb_broadcast(message)
+
+    def disseminate(self, message: Message):
+        """
+        Relays a message delivered for the first time, so every correct node delivers it
+        """
+        if self.dissemination == "gossip":
+            self.gossip(message)
+        else:
+            self.urb_broadcast(Message(MessageType.ECHO, message, self.id, self.current_epoch))
+
+    def gossip(self, message: Message):
+        """
+        Stores a message and forwards it to a random subset of the connected peers
+        """
+        with self.store_lock:
+            self.message_store.setdefault(message.epoch, {})[message.hash()] = message
+            for epoch in [e for e in self.message_store if not self.is_retained(e)]:
+                del self.message_store[epoch]
+        if self.state != State.RUNNING:
+            return
+
+        connected = [peer for peer, peer_socket in self.peer_sockets.items() if peer_socket is not None]
+        for peer in self.rng.sample(connected, min(self.gossip_fanout, len(connected))):
+            self.send(peer, message)
+
+    def anti_entropy(self):
+        """
+        Periodically sends the digest of the recent messages to a random peer
+        The peer pulls whatever it is missing, recovering messages lost by the gossip
+        """
+        while True:
+            time.sleep(self.epoch_duration / 4)
+            connected = [peer for peer, peer_socket in self.peer_sockets.items() if peer_socket is not None]
+            with self.store_lock:
+                hashes = {epoch: list(messages) for epoch, messages in self.message_store.items()}
+            if connected and hashes:
+                digest = Message(MessageType.DIGEST, hashes, self.id, self.current_epoch)
+                self.send(self.rng.choice(connected), digest)
+
+    def handle_digest(self, message: Message):
+        """
+        Requests the messages of a digest that were not received yet
+        @param message: the message containing the digest
+        """
+        missing = {}
+        for epoch, hashes in message.content.items():
+            if not self.is_retained(epoch):
+                continue
+            delivered = self.received_messages.get(epoch, ())
+            if epoch_missing := [h for h in hashes if h not in delivered]:
+                missing[epoch] = epoch_missing
+        if missing and message.sender in self.peers:
+            request = Message(MessageType.REQUEST, missing, self.id, self.current_epoch)
+            self.send(self.peers[message.sender], request)
+
+    def handle_request(self, message: Message):
+        """
+        Sends the requested messages back to the peer that pulled them
+        @param message: the message containing the requested hashes
+        """
+        if message.sender not in self.peers:
+            return
+        with self.store_lock:
+            requested = [
+                self.message_store[epoch][h] for epoch, hashes in message.content.items()
+                for h in hashes if h in self.message_store.get(epoch, {})
+            ]
+        for stored in requested:
+            self.send(self.peers[message.sender], stored)
+
+    def is_retained(self, epoch: int) -> bool:
+        """
+        Checks if the messages of an epoch are still remembered
+        """
+        return epoch > self.current_epoch - self.retained_epochs
+
+    def first_delivery(self, message: Message) -> bool:
+        """
+        Records a message as delivered, forgetting the epochs that are no longer retained
+        Messages older than the retained epochs are never delivered, since they could not be told apart from new ones
+        @param message: the message being delivered
+        :return: True if the message is delivered for the first time, False otherwise
+        """
+        if not self.is_retained(message.epoch):
+            return False
+        delivered = self.received_messages.get(message.epoch)
+        if delivered is None:
+            delivered = self.received_messages[message.epoch] = set()
+            for epoch in [e for e in self.received_messages if not self.is_retained(e)]:
+                del self.received_messages[epoch]
+        h = message.hash()
+        if h in delivered:
+            return False
+        delivered.add(h)
+        return True
+
     def handle_message(self, message: Message):
         """
         Logic for handling a message
@@ -198,16 +342,18 @@ class Node:
         """
         if message.type == MessageType.ECHO:
             echo = message.content
-            if echo.hash() not in self.received_messages:
-                self.received_messages.append(echo.hash())
+            if self.first_delivery(echo):
                 if echo.type == MessageType.PROPOSE:
                     self.handle_block_proposal(echo)
                 elif echo.type == MessageType.VOTE:
                     self.handle_block_vote(echo)
+        elif message.type == MessageType.DIGEST:
+            self.handle_digest(message)
+        elif message.type == MessageType.REQUEST:
+            self.handle_request(message)
         else:
-            if message.hash() not in self.received_messages:
-                self.received_messages.append(message.hash())
-                self.urb_broadcast(Message(MessageType.ECHO, message, self.id, self.current_epoch))
+            if self.first_delivery(message):
+                self.disseminate(message)
                 if message.type == MessageType.PROPOSE:
                     self.handle_block_proposal(message)
                 elif message.type == MessageType.VOTE:
@@ -219,11 +365,13 @@ class Node:
         @param message: the message containing the block proposal
         """
         block = message.content
+        if not block.transactions.is_valid():
+            return
         # check if block extends the longest notarized chain, otherwise ignore it
         if block.length > self.blockchain.length():
             self.blockchain.add_block(block)
             vote_message = Message(MessageType.VOTE, block, self.id, self.current_epoch) # vote for the block
-            self.urb_broadcast(vote_message)
+            self.broadcast(vote_message)
 
     def handle_block_vote(self, message: Message):
         """
@@ -243,27 +391,32 @@ class Node:
 
         print(f"Node {self.id} running protocol")
         while True:
-            start_time = time.time()
+            epoch = self.current_epoch
+            with self.profiler.profile(epoch):
+                start_time = time.time()
 
-            print(f"------------------- Epoch {self.current_epoch} -------------------")
+                print(f"------------------- Epoch {self.current_epoch} -------------------")
             
-            if self.in_confusion_period():
-                print("############# IN CONFUSION PERIOD #############")
+                if self.in_confusion_period():
+                    print("############# IN CONFUSION PERIOD #############")
             
-            self.current_leader = self.elect_leader() # elect the new leader of the epoch
-            if self.current_leader == self.id: # if this node is the leader
-                self.run_leader_phase()
-
-            # wait for the epoch duration
-            elapsed_time = time.time() - start_time
-            time.sleep(max(0, self.epoch_duration - elapsed_time))
-            self.blockchain.update_finalization()
-            self.state = self.next_state()
+                self.current_leader = self.elect_leader() # elect the new leader of the epoch
+                if self.current_leader == self.id: # if this node is the leader
+                    self.run_leader_phase()
+
+                # wait for the epoch duration, it shows up as a single time.sleep entry in the profile
+                elapsed_time = time.time() - start_time
+                time.sleep(max(0, self.epoch_duration - elapsed_time))
+                self.blockchain.update_finalization()
+                self.state = self.next_state()
             
-            self.current_epoch += 1
+                self.current_epoch += 1
+
+                print(f"Leader: Node {self.current_leader}")
+                print(self.blockchain)
 
-            print(f"Leader: Node {self.current_leader}")
-            print(self.blockchain)
+            # write the profiles of the previous epoch, its messages are no longer being handled
+            self.profiler.flush(epoch)
 
     def run_leader_phase(self):
         """
@@ -272,40 +425,37 @@ class Node:
         """
        
         # find the head of the longest notarized chain
-        parent_block = max(
-            self.blockchain.non_finalized_blocks.values(),
-            key=lambda block: block.length if self.blockchain.check_notarization(block) else 0,
-            default=None
-        )
+        parent_block = self.blockchain.snapshot().longest_notarized_block()
         if parent_block is None:
             print("No notarized chain found.")
             return
 
+        # take the pending transactions, new ones go to a fresh batch
+        with self.tx_lock:
+            transactions, self.pending_tx = self.pending_tx, TransactionBatch()
+
         # propose new block
         previous_hash = parent_block.hash()
         new_block = Block(
             previous_hash=previous_hash,
             epoch=self.current_epoch,
             length=parent_block.length + 1,
-            transactions=self.pending_tx.copy()
+            transactions=transactions
         )
-        # clear the pending transactions
-        self.pending_tx.clear()
 
         # broadcast the proposed block
         print(f"Node {self.id} proposing block: {new_block}")
         propose_message = Message(MessageType.PROPOSE, new_block, self.id, self.current_epoch)
-        self.urb_broadcast(propose_message)
+        self.broadcast(propose_message)
 
     def elect_leader(self) -> int:
         """
         Elects the leader of the current epoch
         """
         if self.in_confusion_period():
-            return self.current_epoch % (len(self.peers) + 1)
+            return self.committee.rotating_leader(self.current_epoch)
         else:
-            random.seed(self.seed + self.current_epoch)
-            return random.randint(0, len(self.peers))
+            return self.committee.leader(self.current_epoch)
 
     def wait_start_time(self):
         """
@@ -364,19 +514,21 @@ class Node:
 
         return self.state
 
-if __name__ == "__main__":
-    args = parse_program_args()
-    id = args.id
-    config = load_config("../config.yaml")
-    nodes = config['nodes']
-    host, port = next((p['ip'], p['port']) for p in nodes if p['id'] == id)
-    peers = [(n['ip'], n['port']) for n in nodes if n['id'] != id]
-    epoch_duration = config['epoch_duration']
-    seed = config['seed']
-    confusion_start = int(config['confusion_start'])
-    confusion_duration = int(config['confusion_duration'])
+def run_node(config: Config, id: int):
+    """
+    Runs a node in this process until it is interrupted
+    @param config: the validated configuration
+    @param id: the id of the node to run
+    """
+    node_config = config.node(id)
+    committee = Committee(config.stakes, config.seed, config.quorum)
+    profiling = config.profiling
+    profiler = EpochProfiler(id, profiling.output_dir, list(profiling.epochs), profiling.enabled)
     start_time = read_file('../start_time.txt')
-    node = Node(id, host, port, peers, epoch_duration, seed, start_time, confusion_start, confusion_duration)
+    node = Node(id, node_config.ip, node_config.port, config.peers(id), config.epoch_duration, committee, start_time,
+                config.confusion_start, config.confusion_duration, config.dissemination, config.fanout, profiler)
+    if hasattr(signal, 'SIGUSR1'): # toggle profiling with kill -USR1 <pid>
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle())
     node.start()
 
     # keep the main thread alive
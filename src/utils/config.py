@@ -0,0 +1,197 @@
+import math
+import os
+import pickle
+from dataclasses import dataclass, field
+
+CACHE_VERSION = 1 # bump when the layout of Config changes
+DISSEMINATION_MODES = ("urb", "gossip")
+
+@dataclass(frozen=True, slots=True)
+class NodeConfig:
+    id: int
+    ip: str
+    port: int
+    stake: int = 1
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.ip, self.port
+
+
+@dataclass(frozen=True, slots=True)
+class ProfilingConfig:
+    enabled: bool = False
+    epochs: tuple[int, ...] = ()
+    output_dir: str = "../profiles"
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    epoch_duration: float
+    nodes: tuple[NodeConfig, ...]
+    seed: int
+    wait_for: int
+    confusion_start: int
+    confusion_duration: int
+    quorum: float = 0.5
+    dissemination: str = "urb"
+    gossip_fanout: int = 0
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+
+    def node(self, node_id: int) -> NodeConfig:
+        """
+        Returns the configuration of a node
+        :param node_id: The ID of the node
+        :return: The configuration of the node
+        """
+        for node in self.nodes:
+            if node.id == node_id:
+                return node
+        raise ValueError(f"Node {node_id} is not in the configuration")
+
+    def peers(self, node_id: int) -> dict[int, tuple[str, int]]:
+        """
+        Returns the addresses of the other nodes by id
+        :param node_id: The ID of the node
+        :return: The addresses of the peers of the node
+        """
+        return {n.id: n.address for n in self.nodes if n.id != node_id}
+
+    @property
+    def stakes(self) -> dict[int, int]:
+        return {n.id: n.stake for n in self.nodes}
+
+    @property
+    def fanout(self) -> int:
+        """
+        Number of peers a message is forwarded to in gossip mode, log2(nodes) + 1 unless configured
+        """
+        return self.gossip_fanout or math.ceil(math.log2(len(self.nodes))) + 1
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate(raw: dict) -> Config:
+    """
+    Validates the parsed configuration file and converts it to a Config
+    :param raw: The configuration as parsed from the YAML file
+    :return: The validated configuration
+    :raises ValueError: listing every problem found in the configuration
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Invalid configuration: expected a mapping at the top level")
+    errors = []
+
+    def check(key: str, valid, message: str, default=None, required: bool = True):
+        if key not in raw:
+            if required:
+                errors.append(f"'{key}' is missing")
+            return default
+        value = raw[key]
+        if not valid(value):
+            errors.append(f"'{key}' {message}, got {value!r}")
+            return default
+        return value
+
+    epoch_duration = check('epoch_duration', lambda v: _is_number(v) and v > 0, "must be a positive number")
+    seed = check('seed', _is_int, "must be an integer")
+    wait_for = check('wait_for', lambda v: _is_int(v) and v >= 0, "must be a non-negative integer")
+    confusion_start = check('confusion_start', lambda v: _is_int(v) and v >= 0, "must be a non-negative integer")
+    confusion_duration = check('confusion_duration', lambda v: _is_int(v) and v >= 0,
+                               "must be a non-negative integer")
+    quorum = check('quorum', lambda v: _is_number(v) and 0 < v < 1, "must be between 0 and 1",
+                   default=0.5, required=False)
+    dissemination = check('dissemination', lambda v: v in DISSEMINATION_MODES,
+                          f"must be one of {', '.join(DISSEMINATION_MODES)}", default="urb", required=False)
+    gossip_fanout = check('gossip_fanout', lambda v: _is_int(v) and v >= 0, "must be a non-negative integer",
+                          default=0, required=False)
+
+    nodes = []
+    raw_nodes = check('nodes', lambda v: isinstance(v, list) and len(v) > 0, "must be a non-empty list", default=[])
+    for i, n in enumerate(raw_nodes):
+        if not isinstance(n, dict):
+            errors.append(f"nodes[{i}] must be a mapping, got {n!r}")
+            continue
+        node_errors = len(errors)
+        if not _is_int(n.get('id')) or n['id'] < 0:
+            errors.append(f"nodes[{i}].id must be a non-negative integer, got {n.get('id')!r}")
+        if not isinstance(n.get('ip'), str):
+            errors.append(f"nodes[{i}].ip must be a string, got {n.get('ip')!r}")
+        if not _is_int(n.get('port')) or not 0 < n['port'] < 65536:
+            errors.append(f"nodes[{i}].port must be a port number, got {n.get('port')!r}")
+        if not _is_int(n.get('stake', 1)) or n.get('stake', 1) <= 0:
+            errors.append(f"nodes[{i}].stake must be a positive integer, got {n.get('stake')!r}")
+        if len(errors) == node_errors:
+            nodes.append(NodeConfig(n['id'], n['ip'], n['port'], n.get('stake', 1)))
+
+    ids = [n.id for n in nodes]
+    if len(set(ids)) != len(ids):
+        errors.append("node ids must be unique")
+    addresses = [n.address for n in nodes]
+    if len(set(addresses)) != len(addresses):
+        errors.append("node addresses must be unique")
+
+    raw_profiling = check('profiling', lambda v: v is None or isinstance(v, dict), "must be a mapping",
+                          default=None, required=False) or {}
+    enabled = raw_profiling.get('enabled', False)
+    if not isinstance(enabled, bool):
+        errors.append(f"'profiling.enabled' must be true or false, got {enabled!r}")
+        enabled = False
+    output_dir = raw_profiling.get('output_dir', "../profiles")
+    if not isinstance(output_dir, str):
+        errors.append(f"'profiling.output_dir' must be a string, got {output_dir!r}")
+        output_dir = "../profiles"
+    epochs = raw_profiling.get('epochs') or []
+    if not isinstance(epochs, list) or not all(_is_int(e) for e in epochs):
+        errors.append(f"'profiling.epochs' must be a list of integers, got {epochs!r}")
+        epochs = []
+    profiling = ProfilingConfig(
+        enabled,
+        tuple(epochs),
+        output_dir
+    )
+
+    if errors:
+        raise ValueError("Invalid configuration:\n - " + "\n - ".join(errors))
+
+    return Config(
+        epoch_duration, tuple(nodes), seed, wait_for, confusion_start, confusion_duration,
+        quorum, dissemination, gossip_fanout, profiling
+    )
+
+
+def load(path: str) -> Config:
+    """
+    Loads and validates the configuration, using a cached binary copy when the file is unchanged
+    The YAML parser is only imported when the cache is missing or stale
+    :param path: Path to the YAML configuration file
+    :return: The validated configuration
+    """
+    stat = os.stat(path)
+    key = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    cache_path = path + ".cache"
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, config = pickle.load(f)
+        if cached_key == key:
+            return config
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError, TypeError):
+        pass # missing, unreadable or stale cache, parse the file again
+
+    from utils.utils import load_config
+    config = validate(load_config(path))
+    try:
+        # write then rename, so nodes starting together never read a partial cache
+        tmp_path = f"{cache_path}.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, config), f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass # the cache is only an optimization
+    return config
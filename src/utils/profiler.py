@@ -0,0 +1,153 @@
+import cProfile
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from threading import Lock, RLock
+
+# from Python 3.12 cProfile is built on sys.monitoring: a single profile covers every thread,
+# and only one can be enabled at a time
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+class EpochProfiler:
+    def __init__(self, node_id: int, output_dir: str, epochs: list[int], enabled: bool):
+        """
+        Opt-in deterministic profiler for selected epochs of the node
+        Each profiled epoch is written as one file covering the epoch loop and the message thread
+        @param node_id: the id of the node, used to name the profile files
+        @param output_dir: the directory where the profile files are written
+        @param epochs: the epochs to profile, empty to profile every epoch while enabled
+        @param enabled: whether profiling starts enabled, it can be toggled later by a signal
+        """
+        self.node_id = node_id
+        self.output_dir = output_dir
+        self.epochs = set(epochs)
+        self.enabled = enabled
+        self.profiles = {} # cProfile.Profile by (epoch, section)
+        self.lock_stats = {} # [acquisitions, contended, total wait, max wait] by caller
+        self.stats_lock = Lock() # guards profiles and lock_stats
+
+    def toggle(self):
+        """
+        Enables or disables profiling, to be used as a signal handler
+        """
+        self.enabled = not self.enabled
+        print(f"Profiling {'enabled' if self.enabled else 'disabled'}")
+
+    def should_profile(self, epoch: int) -> bool:
+        return self.enabled and (not self.epochs or epoch in self.epochs)
+
+    def profile(self, epoch: int):
+        """
+        Profiles the epoch loop, to be enabled for the whole epoch
+        When cProfile is process wide this also profiles the other threads
+        :param epoch: The epoch being profiled
+        :return: A context manager
+        """
+        if not self.should_profile(epoch):
+            return nullcontext()
+        return self._profile(epoch, "epoch")
+
+    def profile_thread(self, epoch: int, section: str):
+        """
+        Profiles code running outside the epoch loop, accumulating the results of the same epoch and section
+        Does nothing when cProfile is process wide, since the epoch profile already covers it
+        :param epoch: The epoch being profiled
+        :param section: The name of the profiled thread, e.g. "messages"
+        :return: A context manager
+        """
+        if PROCESS_WIDE or not self.should_profile(epoch):
+            return nullcontext()
+        return self._profile(epoch, section)
+
+    @contextmanager
+    def _profile(self, epoch: int, section: str):
+        with self.stats_lock:
+            if (epoch, section) not in self.profiles:
+                self.profiles[(epoch, section)] = cProfile.Profile()
+            profile = self.profiles[(epoch, section)]
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def record_lock_wait(self, caller: str, wait: float):
+        """
+        Records an acquisition of the blockchain lock
+        :param caller: The function that acquired the lock
+        :param wait: The time spent waiting for the lock in seconds
+        """
+        with self.stats_lock:
+            stats = self.lock_stats.setdefault(caller, [0, 0, 0.0, 0.0])
+            stats[0] += 1
+            if wait > 0:
+                stats[1] += 1
+                stats[2] += wait
+                stats[3] = max(stats[3], wait)
+
+    def lock_report(self) -> str:
+        """
+        Builds the lock contention report, callers with the most wait time first
+        :return: The report as text
+        """
+        with self.stats_lock:
+            rows = sorted(self.lock_stats.items(), key=lambda item: item[1][2], reverse=True)
+        lines = [f"{'caller':<30}{'acquired':>10}{'contended':>11}{'total wait (ms)':>17}{'max wait (ms)':>15}"]
+        for caller, (acquired, contended, total, longest) in rows:
+            lines.append(f"{caller:<30}{acquired:>10}{contended:>11}{total * 1000:>17.3f}{longest * 1000:>15.3f}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, before_epoch: int):
+        """
+        Writes the profiles of the finished epochs, merging the sections of each epoch, and the lock contention report
+        :param before_epoch: Profiles of epochs older than this one are written
+        """
+        finished = {}
+        with self.stats_lock:
+            for epoch, section in [key for key in self.profiles if key[0] < before_epoch]:
+                finished.setdefault(epoch, []).append(self.profiles.pop((epoch, section)))
+            if not finished and not self.lock_stats:
+                return
+        os.makedirs(self.output_dir, exist_ok=True)
+        for epoch, profiles in finished.items():
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(os.path.join(self.output_dir, f"node{self.node_id}-epoch{epoch}.prof"))
+        with open(os.path.join(self.output_dir, f"node{self.node_id}-lock.txt"), 'w') as f:
+            f.write(self.lock_report())
+
+
+class TimedLock:
+    def __init__(self, profiler: EpochProfiler):
+        """
+        Reentrant lock that reports to the profiler how long each caller waited for it
+        @param profiler: the profiler receiving the measurements, only used while it is enabled
+        """
+        self.lock = RLock()
+        self.profiler = profiler
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        return self._acquire(sys._getframe(1).f_code.co_name, blocking, timeout)
+
+    def _acquire(self, caller: str, blocking: bool, timeout: float) -> bool:
+        if not self.profiler.enabled:
+            return self.lock.acquire(blocking, timeout)
+        if self.lock.acquire(blocking=False):
+            self.profiler.record_lock_wait(caller, 0.0)
+            return True
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            self.profiler.record_lock_wait(caller, time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self._acquire(sys._getframe(1).f_code.co_name, True, -1)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
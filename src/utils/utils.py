@@ -1,5 +1,4 @@
 import argparse
-import yaml
 from datetime import datetime, timedelta
 
 def load_config(path: str) -> dict:
@@ -7,6 +6,7 @@ def load_config(path: str) -> dict:
     Loads the configuration from the given YAML file.
     :return: Parsed configuration as a dictionary.
     """
+    import yaml # imported lazily, only needed when the cached configuration is stale
     with open(path, 'r') as file:
         return yaml.safe_load(file)
 
@@ -21,9 +21,12 @@ def read_file(path: str) -> str:
 
 def parse_program_args():
     parser = argparse.ArgumentParser(
-        description="node.py --id <id>"
+        description="main.py [--id <id> | --ids <id> ...] [--config <path>]"
     )
-    parser.add_argument("--id", type=int, required=True, help="ID number for this node")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--id", type=int, help="ID number of the node to run in this process")
+    group.add_argument("--ids", type=int, nargs="+", help="ID numbers of the nodes to launch, all by default")
+    parser.add_argument("--config", default="../config.yaml", help="Path to the configuration file")
     return parser.parse_args()
 
 